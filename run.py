@@ -1,66 +1,119 @@
-import time
+import threading
 import numpy as np
-from src.config import RING_BUFFER_SIZE, SAMPLE_RATE
+from src.config import (
+    RING_BUFFER_SIZE,
+    SAMPLE_RATE,
+    ANALYSIS_WINDOW,
+    PADDED_SIZE,
+    PARALLEL_SPECTRUM_MIN_SIZE,
+    FFT_THREADS,
+    PIPELINED_FFT,
+    FFT_WISDOM_PATH,
+    ADAPTIVE_PEAK_THRESHOLD,
+    DSP_THREAD_PRIORITY,
+    DSP_CPU_CORE,
+)
 from src.audio.ring_buffer import RingBuffer
 from src.audio.input_stream import AudioStream
-from src.dsp.numba_math import blackman_harris_window, apply_window_and_pad, spectral_ops_and_detect
+from src.audio.realtime import promote_current_thread
+from src.dsp.numba_math import (
+    MAX_NOTES,
+    MIN_PEAK_THRESHOLD,
+    MAD_THRESHOLD_FACTOR,
+    blackman_harris_window,
+    apply_window_and_pad,
+    make_frame_detector,
+)
+from src.dsp.fft import RealFFT, PipelinedRealFFT, load_wisdom, save_wisdom
 from src.midi.interface import MidiInterface
 
-def main():
-    # Setup
-    ANALYSIS_WINDOW = 512
-    PADDED_SIZE = 2048
+def dsp_loop(ring_buffer, midi, detect_frame, stop_event):
+    """
+    Analysis loop: runs on its own high-priority thread, fed by the audio callback.
+    `detect_frame` is the session's make_frame_detector kernel.
+    """
+    # Pre-calc window and FFT plan. Built before promoting this thread: the
+    # FFT worker / FFTW threads it starts would otherwise inherit its
+    # SCHED_FIFO policy and single-core pinning.
+    window = blackman_harris_window(ANALYSIS_WINDOW)
+    if PIPELINED_FFT:
+        fft = PipelinedRealFFT(PADDED_SIZE, threads=FFT_THREADS)
+    else:
+        fft = RealFFT(PADDED_SIZE, threads=FFT_THREADS)
+    work_spec = np.empty(PADDED_SIZE // 2 + 1, dtype=np.float32)
+    detected_bins = np.empty(MAX_NOTES, dtype=np.int32)
 
-    ring_buffer = RingBuffer(RING_BUFFER_SIZE)
-    audio_stream = AudioStream(ring_buffer)
-    midi = MidiInterface()
-    midi.open_port()
+    promote_current_thread(DSP_THREAD_PRIORITY, DSP_CPU_CORE)
 
-    # Pre-calc window
-    window = blackman_harris_window(ANALYSIS_WINDOW)
+    while not stop_event.is_set():
+        # 1. Wait for the audio callback to publish a new block
+        # (timeout keeps the loop responsive if the stream stalls)
+        if not ring_buffer.wait_for_data(timeout=0.05):
+            continue
 
-    print("Starting Engine...")
-    audio_stream.start()
+        # Latest audio, read in place from the ring (no copy)
+        ring, write_index = ring_buffer.snapshot()
 
-    try:
-        while True:
-            # 1. Poll Buffer faster (No sleep)
-            # Only process if we have enough new data?
-            # For simplicity in this version, we just poll.
-            # Ideally, we sync this to the callback, but polling fast is OK for V1.
+        # 2. Pre-process (Numba) straight into the zero-padded FFT input.
+        # The same pass measures the RMS for the noise gate.
+        rms = apply_window_and_pad(ring, write_index, window, fft.input)
+        if rms < 0.002: # Silence threshold
+            midi.update_notes([]) # Clear notes if silent
+            if PIPELINED_FFT:
+                fft.reset() # Drop the in-flight frame rather than report it after the gate
+            continue
 
-            # Read latest audio
-            raw_audio = ring_buffer.read_recent(ANALYSIS_WINDOW)
+        # 3. FFT (Pre-planned, outside Numba). Pipelined, this returns the
+        # previous frame's spectrum while the current one transforms.
+        fft_complex = fft.execute()
+        if fft_complex is None:
+            continue
 
-            # Check RMS (Noise Gate)
-            rms = np.sqrt(np.mean(raw_audio**2))
-            if rms < 0.002: # Silence threshold
-                midi.update_notes([]) # Clear notes if silent
-                time.sleep(0.001) # Tiny sleep to save CPU on silence
-                continue
+        # 4. Magnitude + Whitening + Detect, in one Numba call
+        n_detected = detect_frame(fft_complex, work_spec, detected_bins, MIN_PEAK_THRESHOLD)
 
-            # 2. Pre-process (Numba)
-            ready_for_fft = apply_window_and_pad(raw_audio, window, PADDED_SIZE)
+        # 5. MIDI
+        midi.update_notes_from_bins(detected_bins[:n_detected])
 
-            # 3. FFT (Standard Numpy - Fast C implementation)
-            fft_complex = np.fft.rfft(ready_for_fft)
-            fft_magnitude = np.abs(fft_complex).astype(np.float32)
+    if PIPELINED_FFT:
+        fft.close()
 
-            # 4. Detect (Numba)
-            detected_freqs = spectral_ops_and_detect(fft_magnitude, SAMPLE_RATE, PADDED_SIZE)
+def main():
+    # Setup
+    ring_buffer = RingBuffer(RING_BUFFER_SIZE)
+    audio_stream = AudioStream(ring_buffer)
+    midi = MidiInterface()
+    midi.open_port()
 
-            # 5. MIDI
-            midi.update_notes(detected_freqs)
+    # Build (or load from cache) the specialized detector before audio starts,
+    # so compilation never stalls the stream or the first frames
+    detect_frame = make_frame_detector(
+        SAMPLE_RATE, PADDED_SIZE,
+        parallel=PADDED_SIZE >= PARALLEL_SPECTRUM_MIN_SIZE,
+        mad_factor=MAD_THRESHOLD_FACTOR if ADAPTIVE_PEAK_THRESHOLD else 0.0,
+    )
+    # Same for FFTW: reuse the plans measured on a previous run
+    load_wisdom(FFT_WISDOM_PATH)
 
-            # Tiny sleep to prevent 100% CPU usage, but low enough for latency
-            # 1ms sleep = 1000Hz update rate
-            time.sleep(0.001)
+    stop_event = threading.Event()
+    dsp_thread = threading.Thread(target=dsp_loop, args=(ring_buffer, midi, detect_frame, stop_event), daemon=True)
 
+    print("Starting Engine...")
+    audio_stream.start()
+    dsp_thread.start()
+
+    try:
+        # Main thread only waits for Ctrl+C
+        while dsp_thread.is_alive():
+            dsp_thread.join(timeout=0.1)
     except KeyboardInterrupt:
         pass
     finally:
+        stop_event.set()
+        dsp_thread.join()
         audio_stream.stop()
         midi.close_port()
+        save_wisdom(FFT_WISDOM_PATH)
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,37 @@
+import os
+import sys
+
+def promote_current_thread(priority, cpu_core=None):
+    """
+    Best-effort realtime scheduling for the calling thread.
+    Linux: SCHED_FIFO at `priority` and pinned to `cpu_core`.
+    Windows: THREAD_PRIORITY_TIME_CRITICAL and pinned to `cpu_core`.
+    Anything not permitted (no privileges, core missing, other OS) is skipped
+    with a warning; the thread keeps running at normal priority.
+    """
+    if sys.platform == "win32":
+        _promote_windows(cpu_core)
+        return
+
+    try:
+        # pid 0 = calling thread on Linux
+        os.sched_setscheduler(0, os.SCHED_FIFO, os.sched_param(priority))
+    except (AttributeError, OSError) as e:
+        print(f"Warning: realtime scheduling unavailable ({e})", file=sys.stderr)
+
+    if cpu_core is not None:
+        try:
+            os.sched_setaffinity(0, {cpu_core})
+        except (AttributeError, OSError) as e:
+            print(f"Warning: could not pin DSP thread to core {cpu_core} ({e})", file=sys.stderr)
+
+def _promote_windows(cpu_core):
+    import ctypes
+    THREAD_PRIORITY_TIME_CRITICAL = 15
+
+    kernel32 = ctypes.windll.kernel32
+    thread = kernel32.GetCurrentThread()
+    if not kernel32.SetThreadPriority(thread, THREAD_PRIORITY_TIME_CRITICAL):
+        print("Warning: could not raise DSP thread priority", file=sys.stderr)
+    if cpu_core is not None and not kernel32.SetThreadAffinityMask(thread, 1 << cpu_core):
+        print(f"Warning: could not pin DSP thread to core {cpu_core}", file=sys.stderr)
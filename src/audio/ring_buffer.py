@@ -1,12 +1,34 @@
+import threading
 import numpy as np
 
 class RingBuffer:
+    """
+    Single-producer / single-consumer ring buffer.
+    The audio callback is the only writer and the DSP loop the only reader.
+
+    The writer copies the samples in first and publishes the new write_count
+    last, as a single attribute store (atomic in CPython). The reader snapshots
+    write_count once per read, so it never acts on a half-updated position and
+    no lock is needed between the two threads.
+    """
     def __init__(self, capacity, dtype=np.float32):
         self.capacity = capacity
         self.dtype = dtype
         self.buffer = np.zeros(capacity, dtype=dtype)
-        self.write_index = 0
-        self.is_full = False
+        # Total samples ever written (monotonic, never wraps)
+        self.write_count = 0
+        # Reader-owned output arrays for read_recent, keyed by n_samples
+        self._read_scratch = {}
+        # Set by the writer after each publish, so the reader can block instead of polling
+        self._data_ready = threading.Event()
+
+    @property
+    def write_index(self):
+        return self.write_count % self.capacity
+
+    @property
+    def is_full(self):
+        return self.write_count >= self.capacity
 
     def write(self, data):
         """
@@ -18,38 +40,71 @@ class RingBuffer:
             data = data[-self.capacity:]
             data_len = self.capacity
 
-        # Calculate indices
-        end_index = self.write_index + data_len
+        write_count = self.write_count
+        start = write_count % self.capacity
+        end = start + data_len
 
-        if end_index <= self.capacity:
+        if end <= self.capacity:
             # Simple write (no wrap-around needed for this chunk)
-            self.buffer[self.write_index:end_index] = data
-            self.write_index = end_index
+            self.buffer[start:end] = data
         else:
             # Wrap-around write
-            first_part_len = self.capacity - self.write_index
-            self.buffer[self.write_index:] = data[:first_part_len]
-            second_part_len = data_len - first_part_len
-            self.buffer[:second_part_len] = data[first_part_len:]
-            self.write_index = second_part_len
-            self.is_full = True
+            first_part_len = self.capacity - start
+            self.buffer[start:] = data[:first_part_len]
+            self.buffer[:data_len - first_part_len] = data[first_part_len:]
 
-        if self.write_index == self.capacity:
-            self.write_index = 0
-            self.is_full = True
+        # Publish only once the samples are in place
+        self.write_count = write_count + data_len
+        self._data_ready.set()
+
+    def wait_for_data(self, timeout=None):
+        """
+        Blocks until the writer publishes new samples, or timeout (seconds).
+        Returns True if new data arrived.
+        """
+        arrived = self._data_ready.wait(timeout)
+        # Clear before the caller snapshots: anything written from here on
+        # sets the event again, so no block is missed.
+        self._data_ready.clear()
+        return arrived
+
+    def snapshot(self):
+        """
+        Returns (buffer, write_index) without copying.
+        The most recent samples end just before write_index and wrap around
+        the end of buffer. The writer keeps going, so consume the snapshot
+        promptly: data is only overwritten once the writer laps the reader.
+        """
+        return self.buffer, self.write_count % self.capacity
 
     def read_recent(self, n_samples):
         """
         Returns the most recent n_samples from the buffer.
+        The returned array is reused by the next read of the same size;
+        copy it if it must outlive that.
+        """
+        out = self._read_scratch.get(n_samples)
+        if out is None:
+            out = np.empty(n_samples, dtype=self.dtype)
+            self._read_scratch[n_samples] = out
+        return self.read_recent_into(out)
+
+    def read_recent_into(self, out):
+        """
+        Copies the most recent len(out) samples into out and returns it.
         """
+        n_samples = len(out)
         if n_samples > self.capacity:
             raise ValueError("Requested samples exceed buffer capacity")
 
-        if self.write_index >= n_samples:
-            return self.buffer[self.write_index - n_samples : self.write_index].copy()
+        # Snapshot the writer position once
+        end = self.write_count % self.capacity
+
+        if end >= n_samples:
+            out[:] = self.buffer[end - n_samples : end]
         else:
             # Need to wrap around to get the most recent data
-            part1_len = n_samples - self.write_index
-            part1 = self.buffer[-part1_len:]
-            part2 = self.buffer[:self.write_index]
-            return np.concatenate((part1, part2))
+            part1_len = n_samples - end
+            out[:part1_len] = self.buffer[-part1_len:]
+            out[part1_len:] = self.buffer[:end]
+        return out
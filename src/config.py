@@ -1,6 +1,37 @@
 # Project: PyPolyGuitar
 # File: src/config.py
 
+import os
+from scipy.fft import next_fast_len
+
 SAMPLE_RATE = 48000
 BUFFER_SIZE = 128
 RING_BUFFER_SIZE = 2048
+
+# FFT analysis
+ANALYSIS_WINDOW = 512
+# Target bin spacing (Hz) of the zero-padded spectrum.
+FREQ_RESOLUTION = 24.0
+# Smallest 2/3/5-smooth length giving FREQ_RESOLUTION. Mixed-radix FFTs cost
+# only a few percent more per point than power-of-two sizes, so there is no
+# need to round up to 2048 (48000 / 24 -> 2000).
+PADDED_SIZE = next_fast_len(max(ANALYSIS_WINDOW, int(SAMPLE_RATE / FREQ_RESOLUTION)), real=True)
+# FFT size from which the magnitude/whitening pass and the peak search are
+# split across threads.
+# Below this the thread wake-up outweighs the work (~1000 bins at PADDED_SIZE=2000).
+PARALLEL_SPECTRUM_MIN_SIZE = 4096
+# pyFFTW only: threads per transform (more only pays off for much larger sizes)
+FFT_THREADS = 1
+# Run each frame's FFT on a worker thread, overlapped with peak detection on
+# the previous frame. Off by default: it adds one frame of latency.
+PIPELINED_FFT = False
+# pyFFTW only: FFTW_MEASURE plans are saved here on exit and reused on start
+FFT_WISDOM_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "fftw_wisdom.json")
+
+# Raise the peak threshold with the spectrum's noise floor (median absolute
+# deviation). Off by default: it costs more per frame than the search itself.
+ADAPTIVE_PEAK_THRESHOLD = False
+
+# DSP thread scheduling (best effort; silently skipped where not permitted)
+DSP_THREAD_PRIORITY = 80 # SCHED_FIFO priority on Linux
+DSP_CPU_CORE = None # Core to pin the DSP thread to (None = no pinning)
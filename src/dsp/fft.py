@@ -0,0 +1,129 @@
+import json
+import sys
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+from scipy import fft as scipy_fft
+
+# pyFFTW is optional: a pre-planned FFTW transform is noticeably faster for
+# repeated transforms of the same size. Fall back to scipy.fft if missing.
+try:
+    import pyfftw
+    pyfftw.interfaces.cache.enable()
+    _HAS_PYFFTW = True
+except ImportError:
+    _HAS_PYFFTW = False
+
+def load_wisdom(path):
+    """
+    Imports FFTW wisdom saved by save_wisdom, so FFTW_MEASURE planning is
+    paid once per machine rather than on every start.
+    Must run before the RealFFT plans are built. Returns True if loaded;
+    a missing, corrupt or stale file just means no wisdom.
+    """
+    if not _HAS_PYFFTW:
+        return False
+    try:
+        with open(path, 'r', encoding='ascii') as f:
+            wisdom = tuple(w.encode('latin-1') for w in json.load(f))
+        return all(pyfftw.import_wisdom(wisdom))
+    except Exception:
+        return False
+
+def save_wisdom(path):
+    """
+    Writes the accumulated FFTW wisdom to `path` as JSON (no-op without pyFFTW).
+    """
+    if not _HAS_PYFFTW:
+        return
+    try:
+        wisdom = [w.decode('latin-1') for w in pyfftw.export_wisdom()]
+        with open(path, 'w', encoding='ascii') as f:
+            json.dump(wisdom, f)
+    except OSError as e:
+        print(f"Warning: could not save FFTW wisdom ({e})", file=sys.stderr)
+
+class RealFFT:
+    """
+    Real-input FFT of a fixed size, bound to pre-allocated buffers.
+    Write samples into `input`, call `execute()`, read the result from `output`.
+    """
+    def __init__(self, size, threads=1):
+        self.size = size
+
+        if _HAS_PYFFTW:
+            self.input = pyfftw.empty_aligned(size, dtype='float32')
+            self.output = pyfftw.empty_aligned(size // 2 + 1, dtype='complex64')
+            # No FFTW_DESTROY_INPUT: callers rely on the zero-padded tail of
+            # `input` surviving between frames.
+            self._plan = pyfftw.FFTW(self.input, self.output, flags=('FFTW_MEASURE',), threads=threads)
+        else:
+            self.input = np.zeros(size, dtype=np.float32)
+            self.output = np.zeros(size // 2 + 1, dtype=np.complex64)
+            self._plan = None
+
+        # FFTW_MEASURE scribbles over the input while planning
+        self.input[:] = 0.0
+
+    def execute(self):
+        """
+        Transforms `input` into `output` and returns `output`.
+        """
+        if self._plan is not None:
+            # Raw plan execution (releases the GIL). FFTW.__call__ would
+            # re-validate/copy the arrays and handle normalisation first.
+            self._plan.execute()
+        else:
+            # scipy's pocketfft caches its plans and stays in single precision
+            # for float32 input. overwrite_x is not used: the zero-padded
+            # tail of `input` must survive.
+            self.output[:] = scipy_fft.rfft(self.input)
+        return self.output
+
+class PipelinedRealFFT:
+    """
+    Two RealFFTs used alternately, each transform running on a worker thread,
+    so frame N's FFT overlaps the caller's work on frame N-1's spectrum
+    (both pyFFTW and scipy.fft release the GIL while transforming).
+    Write samples into `input`, then call `execute()`: it starts that transform
+    and returns the previous frame's spectrum (None on the first frame).
+    This adds one frame of latency. Create it before pinning or promoting
+    the calling thread, so the worker can run on another core.
+    """
+    def __init__(self, size, threads=1):
+        self.size = size
+        self._ffts = (RealFFT(size, threads), RealFFT(size, threads))
+        self._pool = ThreadPoolExecutor(max_workers=1)
+        # Start the worker now, not on the first execute(): it takes its
+        # scheduling and CPU affinity from the thread that creates it.
+        self._pool.submit(lambda: None).result()
+        self._current = 0
+        self._pending = None
+
+    @property
+    def input(self):
+        # The other buffer's input is free: its transform has been collected
+        return self._ffts[self._current].input
+
+    def execute(self):
+        """
+        Starts transforming `input` and returns the previous frame's output,
+        or None if there is none. That output stays valid until the next call.
+        """
+        previous = self._pending
+        self._pending = self._pool.submit(self._ffts[self._current].execute)
+        self._current ^= 1
+        if previous is None:
+            return None
+        return previous.result()
+
+    def reset(self):
+        """
+        Drops the frame in flight (e.g. when the input goes silent).
+        """
+        if self._pending is not None:
+            self._pending.result()
+            self._pending = None
+
+    def close(self):
+        self.reset()
+        self._pool.shutdown()
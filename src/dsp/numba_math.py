@@ -1,116 +1,313 @@
+import functools
 import numpy as np
-from numba import jit
-from numba.typed import List
+from numba import jit, prange
+
+# Kernels on the per-frame path are declared with explicit signatures: they
+# compile at import (not on the first audio frame) and are cached on disk.
+# The rest compile on first use.
+# `[::1]` marks arrays C-contiguous so loads can be vectorized.
+# All kernels release the GIL (nogil=True) so the DSP thread never stalls the
+# audio callback: keep them to arrays and scalars, never Python objects.
+# (inline='always' helpers are compiled into their callers and inherit this.)
+
+# Harmonics usually don't go past 6 for guitar processing relevance
+MAX_NOTES = 6
+
+# Whitened magnitude below which the peak search stops
+MIN_PEAK_THRESHOLD = 0.05
+
+# Adaptive peak threshold: how many median absolute deviations above the
+# spectrum's median a peak must also be (pass as mad_factor; 0 disables it)
+MAD_THRESHOLD_FACTOR = 5.0
+
+# Lowest frequency (Hz) considered by the peak search
+LOWEST_SEARCH_FREQ = 70.0
+
+# Number of blocks the peak search splits the spectrum into; each block's
+# maximum is tracked so only blocks touched by suppression are rescanned
+PEAK_SEARCH_BLOCKS = 32
 
-@jit(nopython=True)
 def blackman_harris_window(size):
     """
     Generates a Blackman-Harris window of the given size.
+    Windows are memoized per size; each call returns a fresh copy so callers
+    may modify it.
     """
+    return _blackman_harris_window(size).copy()
+
+@functools.lru_cache(maxsize=8)
+def _blackman_harris_window(size):
+    # Plain NumPy: built once per size, so there is nothing to JIT.
     a0 = 0.35875
     a1 = 0.48829
     a2 = 0.14128
     a3 = 0.01168
 
-    window = np.zeros(size, dtype=np.float32)
-    for n in range(size):
-        term1 = a1 * np.cos(2 * np.pi * n / (size - 1))
-        term2 = a2 * np.cos(4 * np.pi * n / (size - 1))
-        term3 = a3 * np.cos(6 * np.pi * n / (size - 1))
-        window[n] = a0 - term1 + term2 - term3
-
+    x = 2 * np.pi * np.arange(size) / (size - 1)
+    window = (a0 - a1 * np.cos(x) + a2 * np.cos(2 * x) - a3 * np.cos(3 * x)).astype(np.float32)
+    window.setflags(write=False)
     return window
 
-@jit(nopython=True)
-def apply_window_and_pad(buffer, window, padded_size):
+@jit('float64(float32[::1], int64, float32[::1], float32[::1])',
+     nopython=True, nogil=True, cache=True, fastmath=True, boundscheck=False)
+def apply_window_and_pad(ring, write_index, window, padded_out):
     """
-    Applies window and pads buffer with zeros.
-    Returns a float32 array ready for FFT.
+    Windows the len(window) samples that end at write_index in ring and writes
+    them into the head of padded_out. Reads wrap around the end of ring, so a
+    RingBuffer snapshot can be windowed without copying it out first
+    (for a plain buffer pass write_index=len(buffer)).
+    The tail (padded_out[len(window):]) is never touched: it must be zeroed
+    once at allocation and then stays zero across frames.
+    Returns the RMS of the raw (unwindowed) samples, accumulated in the same
+    pass, for the noise gate.
     """
-    out = np.zeros(padded_size, dtype=np.float32)
-    # Direct copy with window
-    for i in range(len(buffer)):
-        out[i] = buffer[i] * window[i]
-    return out
+    n = len(window)
+    capacity = len(ring)
+    start = write_index - n
+    if start < 0:
+        start += capacity
+
+    sum_squares = np.float32(0.0)
+
+    # Two segments: up to the end of the ring, then from its start
+    first = min(n, capacity - start)
+    for i in range(first):
+        sample = ring[start + i]
+        sum_squares += sample * sample
+        padded_out[i] = sample * window[i]
+    for i in range(first, n):
+        sample = ring[i - first]
+        sum_squares += sample * sample
+        padded_out[i] = sample * window[i]
+
+    return np.sqrt(sum_squares / n)
 
-@jit(nopython=True)
-def spectral_ops_and_detect(fft_magnitude, sample_rate, padded_size, min_threshold=0.05):
+@jit(nopython=True, inline='always')
+def _magnitude_and_whiten(fft_complex, out):
     """
-    Performs Whitening and Iterative Subtraction.
-    Returns list of detected frequencies.
+    Writes |fft_complex| into out, normalized so its peak is 1.0.
     """
-    # 1. Spectral Whitening (Normalize)
-    max_val = 0.0
-    for i in range(len(fft_magnitude)):
-        if fft_magnitude[i] > max_val:
-            max_val = fft_magnitude[i]
+    v = fft_complex.view(np.float32).reshape(-1, 2)
+    max_val = np.float32(0.0)
+    for i in range(v.shape[0]):
+        re = v[i, 0]
+        im = v[i, 1]
+        mag = np.sqrt(re * re + im * im)
+        out[i] = mag
+        if mag > max_val:
+            max_val = mag
 
     if max_val > 0:
-        for i in range(len(fft_magnitude)):
-            fft_magnitude[i] /= max_val
+        inv = np.float32(1.0) / max_val
+        for i in range(v.shape[0]):
+            out[i] *= inv
 
-    # 2. Iterative Subtraction
-    detected_frequencies = List()
-    freq_res = sample_rate / padded_size
+@jit(nopython=True, inline='always')
+def _magnitude_and_whiten_prange(fft_complex, out):
+    """
+    _magnitude_and_whiten with prange loops, for parallel=True callers.
+    """
+    v = fft_complex.view(np.float32).reshape(-1, 2)
+    n = v.shape[0]
+    max_val = np.float32(0.0)
+    for i in prange(n):
+        re = v[i, 0]
+        im = v[i, 1]
+        mag = np.sqrt(re * re + im * im)
+        out[i] = mag
+        max_val = max(max_val, mag)
 
-    # Harmonics usually don't go past 6 for guitar processing relevance
-    max_notes = 6
+    if max_val > 0:
+        inv = np.float32(1.0) / max_val
+        for i in prange(n):
+            out[i] *= inv
 
-    # Copy spectrum to work on it
-    work_spec = fft_magnitude.copy()
+@jit(nopython=True, nogil=True, cache=True, fastmath=True)
+def spectral_whitening(fft_magnitude):
+    """
+    Normalizes the magnitude spectrum in place so its peak is 1.0.
+    """
+    max_val = fft_magnitude.max()
+    if max_val > 0:
+        fft_magnitude *= np.float32(1.0) / max_val
 
-    for _ in range(max_notes):
-        # Find peak
-        peak_mag = -1.0
-        peak_idx = -1
+@jit(nopython=True, inline='always')
+def _argmax_nonneg(values, start):
+    """
+    Index of the first maximum of values[start:] (offset by start).
+    Only valid for non-negative floats, whose IEEE bit patterns sort like the
+    values: each bin is packed as (bits << 32 | ~index) into a uint64, so a
+    branchless max() over the keys finds the peak and its lowest index at once.
+    """
+    bits = values[start:].view(np.uint32)
+    best = np.uint64(0)
+    for i in range(bits.shape[0]):
+        key = (np.uint64(bits[i]) << np.uint64(32)) | np.uint64(0xFFFFFFFF - i)
+        best = max(best, key)
+    return start + (0xFFFFFFFF - np.int64(best & np.uint64(0xFFFFFFFF)))
 
-        # Start searching from ~70Hz (approx bin 3) to avoid DC offset/rumble
-        start_bin = 3
+@jit(nopython=True, inline='always')
+def _rescan_block(work_spec, n_bins, block_peak, b, start_bin, block_size):
+    """
+    Re-finds the maximum of block b of the search range into block_peak[b].
+    """
+    lo = start_bin + b * block_size
+    hi = min(lo + block_size, n_bins)
+    block_peak[b] = _argmax_nonneg(work_spec[:hi], lo)
+
+@jit(nopython=True, inline='always')
+def _suppress(work_spec, n_bins, block_peak, start_bin, block_size, low, high):
+    """
+    Zeroes work_spec[low:high] and rescans the blocks whose maximum was zeroed.
+    Zeroing only lowers bins, so any other block keeps its maximum.
+    """
+    work_spec[low:high] = 0.0
+    if high <= start_bin:
+        return
+    first = (max(low, start_bin) - start_bin) // block_size
+    last = (high - 1 - start_bin) // block_size
+    for b in range(first, last + 1):
+        if low <= block_peak[b] < high:
+            _rescan_block(work_spec, n_bins, block_peak, b, start_bin, block_size)
+
+# Inlined so make_frame_detector's closure constants (n_bins, start_bin,
+# mad_factor=0) are folded into its compiled code
+@jit(nopython=True, inline='always')
+def _subtract_peaks(work_spec, n_bins, out_bins, min_threshold, start_bin, mad_factor):
+    """
+    Iterative Subtraction on work_spec[:n_bins], which it overwrites
+    (n_bins must not exceed len(work_spec)).
+    Writes the FFT bin of each detected fundamental into out_bins and returns the count.
+    mad_factor > 0 also requires peaks above median + mad_factor * MAD of the search range.
+    """
+    n_found = 0
+    max_notes = len(out_bins)
+
+    # float32 like the spectrum, so the peak compare is not widened to float64
+    threshold = np.float32(min_threshold)
+    if mad_factor > 0:
+        search = work_spec[start_bin:n_bins]
+        median = np.median(search)
+        mad = np.median(np.abs(search - median))
+        threshold = np.float32(max(min_threshold, median + mad_factor * mad))
 
-        for i in range(start_bin, len(work_spec)):
-            if work_spec[i] > peak_mag:
-                peak_mag = work_spec[i]
-                peak_idx = i
+    # Split the search range into blocks and find each block's maximum once
+    # (independent, so prange). The global peak is then the loudest of the
+    # block maxima, instead of a full rescan every iteration.
+    search_len = n_bins - start_bin
+    if search_len <= 0:
+        return 0
+    block_size = (search_len + PEAK_SEARCH_BLOCKS - 1) // PEAK_SEARCH_BLOCKS
+    n_blocks = (search_len + block_size - 1) // block_size
+    block_peak = np.empty(n_blocks, dtype=np.int64)
+    for b in prange(n_blocks):
+        _rescan_block(work_spec, n_bins, block_peak, b, start_bin, block_size)
+
+    for _ in range(max_notes):
+        # Find peak among the block maxima (ties go to the lowest bin)
+        peak_idx = block_peak[0]
+        peak_mag = work_spec[peak_idx]
+        for b in range(1, n_blocks):
+            c = block_peak[b]
+            if work_spec[c] > peak_mag:
+                peak_mag = work_spec[c]
+                peak_idx = c
 
         # Threshold check
-        if peak_mag < min_threshold:
+        if peak_mag < threshold:
             break
 
         # Add to results
-        detected_frequencies.append(peak_idx * freq_res)
+        out_bins[n_found] = peak_idx
+        n_found += 1
 
         # Kill the fundamental and its harmonics
         fundamental = peak_idx
 
         # Suppress fundamental (kill zone: +/- 2 bins)
         low = max(0, fundamental - 2)
-        high = min(len(work_spec), fundamental + 3)
-        work_spec[low:high] = 0.0
+        high = min(n_bins, fundamental + 3)
+        _suppress(work_spec, n_bins, block_peak, start_bin, block_size, low, high)
 
         # Suppress harmonics (integer multiples)
-        # We assume harmonics up to 5th order
-        for h in range(2, 6):
+        # We assume harmonics up to 5th order. Harmonic h sits exactly on bin
+        # h * fundamental, so the loop bound replaces a per-harmonic range check.
+        n_harmonics = min(5, (n_bins - 1) // fundamental)
+        for h in range(2, n_harmonics + 1):
             harmonic_idx = fundamental * h
-            if harmonic_idx < len(work_spec):
-                # Wider kill zone for harmonics (strings stretch!)
-                # Kill +/- 3 bins around harmonic
-                h_low = max(0, harmonic_idx - 3)
-                h_high = min(len(work_spec), harmonic_idx + 4)
-                work_spec[h_low:h_high] = 0.0
+            # Wider kill zone for harmonics (strings stretch!)
+            # Kill +/- 3 bins around harmonic
+            h_low = max(0, harmonic_idx - 3)
+            h_high = min(n_bins, harmonic_idx + 4)
+            _suppress(work_spec, n_bins, block_peak, start_bin, block_size, h_low, h_high)
+
+    return n_found
 
-    return detected_frequencies
+@jit('int64(float64)', nopython=True, nogil=True, cache=True)
+def _search_start_bin(freq_res):
+    # Start searching from ~70Hz (bin 3 at ~24Hz resolution) to avoid DC offset/rumble
+    return max(1, int(round(LOWEST_SEARCH_FREQ / freq_res)))
 
-@jit(nopython=True)
+def make_frame_detector(sample_rate, padded_size, parallel=False, mad_factor=0.0):
+    """
+    Returns the per-frame detector for one session:
+    detect_frame(fft_complex, work_spec, out_bins, min_threshold) -> count.
+    Whitens |fft_complex| into work_spec (padded_size // 2 + 1 bins) and writes
+    the FFT bin of each detected note into out_bins.
+    parallel=True splits the work across threads; mad_factor > 0 enables the
+    adaptive threshold (see MAD_THRESHOLD_FACTOR).
+    """
+    start_bin = _search_start_bin(sample_rate / padded_size)
+    n_bins = padded_size // 2 + 1
+
+    @jit('int64(complex64[::1], float32[::1], int32[::1], float64)',
+         nopython=True, nogil=True, parallel=parallel, cache=True, fastmath=True, boundscheck=False)
+    def detect_frame(fft_complex, work_spec, out_bins, min_threshold):
+        if len(fft_complex) != n_bins or len(work_spec) != n_bins:
+            raise ValueError("spectrum size does not match padded_size")
+        # Branch on the captured bool: capturing a dispatcher instead would
+        # change the disk cache key on every run
+        if parallel:
+            _magnitude_and_whiten_prange(fft_complex, work_spec)
+        else:
+            _magnitude_and_whiten(fft_complex, work_spec)
+        return _subtract_peaks(work_spec, n_bins, out_bins, min_threshold, start_bin, mad_factor)
+
+    return detect_frame
+
+# No explicit signature: eager signatures cannot take omitted default
+# arguments. Compiled on first use, then loaded from the disk cache.
+@jit(nopython=True, nogil=True, cache=True)
+def spectral_ops_and_detect(fft_magnitude, work_spec, sample_rate, padded_size, min_threshold=MIN_PEAK_THRESHOLD, mad_factor=0.0):
+    """
+    Performs Whitening and Iterative Subtraction in work_spec (scratch, same
+    size as fft_magnitude); fft_magnitude itself is left untouched.
+    mad_factor > 0 enables the adaptive threshold (see MAD_THRESHOLD_FACTOR).
+    Returns a float32 array of the detected frequencies (at most MAX_NOTES).
+    """
+    work_spec[:] = fft_magnitude
+    spectral_whitening(work_spec)
+
+    out_freqs = np.empty(MAX_NOTES, dtype=np.float32)
+    freq_res = sample_rate / padded_size
+    n_found = _subtract_peaks(work_spec, len(work_spec), out_freqs, min_threshold, _search_start_bin(freq_res), mad_factor)
+    return out_freqs[:n_found] * np.float32(freq_res)
+
+@jit(nopython=True, nogil=True, cache=True, fastmath=True, boundscheck=False)
 def calculate_rms(buffer):
     """
     Calculates the Root Mean Square (RMS) of a buffer.
+    A plain float32 reduction: fastmath lets LLVM reassociate the sum, so
+    it is vectorized into several SIMD accumulators without unrolling by hand
+    (and beats a BLAS sdot call at these sizes).
     """
-    sum_squares = 0.0
-    for sample in buffer:
-        sum_squares += sample * sample
+    sum_squares = np.float32(0.0)
+    for i in range(len(buffer)):
+        sum_squares += buffer[i] * buffer[i]
     return np.sqrt(sum_squares / len(buffer))
 
-@jit(nopython=True)
+# Lazily compiled and cached, like spectral_ops_and_detect (default arguments)
+@jit(nopython=True, nogil=True, cache=True)
 def detect_transient(current_rms, previous_rms, threshold_ratio=2.0, min_rms=0.01):
     """
     Detects a transient if the RMS spike is above a threshold.
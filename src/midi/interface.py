@@ -1,70 +1,148 @@
 import mido
-import math
+import numpy as np
+from src.config import SAMPLE_RATE, PADDED_SIZE
+
+# Ignore rumble below ~60Hz
+MIN_NOTE_FREQ = 60
+
+# Channel 1 status bytes
+NOTE_ON = 0x90
+NOTE_OFF = 0x80
 
 class MidiInterface:
-    def __init__(self, port_name="loopMIDI Port"):
+    def __init__(self, port_name="loopMIDI Port", sample_rate=SAMPLE_RATE, padded_size=PADDED_SIZE):
         self.port_name = port_name
         self.output_port = None
+        self._raw_send = None # Backend's raw byte writer, when it has one
 
-        # State tracking
-        self.active_midi_notes = set() # Set of MIDI numbers currently ON
+        # State tracking: MIDI has exactly 128 notes, so sets of notes are
+        # Python int bitmasks (bit n = note n) and set algebra is bitwise.
+        self._active_mask = 0 # Notes currently ON
 
-        # Debounce tracking: {midi_note: frames_missing_count}
-        self.missing_counter = {}
+        # Debounce tracking, only for active notes missing from recent frames:
+        # {midi_note: frames_missing_count}
+        self._missing = {}
         self.FRAMES_TO_KILL = 3 # Note must be missing for 3 frames to turn off
 
+        # Detected peaks are FFT bins, so there are only padded_size // 2 + 1
+        # possible inputs: precompute bin -> MIDI note once (-1 = no note),
+        # and bin -> note bit (0 = no note) for building the incoming mask.
+        freqs = np.arange(padded_size // 2 + 1) * (sample_rate / padded_size)
+        self._bin_to_midi = np.full(len(freqs), -1, dtype=np.int16)
+        audible = freqs > MIN_NOTE_FREQ
+        notes = np.round(69 + 12 * np.log2(freqs[audible] / 440)).astype(np.int16)
+        self._bin_to_midi[audible] = np.where(notes <= 127, notes, -1)
+        self._bin_to_bit = [1 << n if n >= 0 else 0 for n in self._bin_to_midi.tolist()]
+
+    @property
+    def active_midi_notes(self):
+        """Set of MIDI numbers currently ON."""
+        return set(_notes_in(self._active_mask))
+
+    @property
+    def missing_counter(self):
+        """Debounce tracking: {midi_note: frames_missing_count}."""
+        return dict(self._missing)
+
     def open_port(self):
         try:
             self.output_port = mido.open_output(self.port_name)
+            # The rtmidi backend takes raw bytes: skips building a
+            # mido.Message per note on the DSP thread.
+            rt = getattr(self.output_port, '_rt', None)
+            self._raw_send = getattr(rt, 'send_message', None)
             print(f"MIDI Port Opened: {self.port_name}")
         except:
             print("Could not open MIDI port. Is loopMIDI running?")
 
     def close_port(self):
         if self.output_port:
-            for note in list(self.active_midi_notes):
+            for note in _notes_in(self._active_mask):
                 self.send_note_off(note)
+            self._active_mask = 0
+            self._missing.clear()
             self.output_port.close()
+            self.output_port = None
+            self._raw_send = None
 
     def send_note_on(self, note, vel=100):
-        if self.output_port:
+        if self._raw_send is not None:
+            self._raw_send([NOTE_ON, note, vel])
+        elif self.output_port:
             self.output_port.send(mido.Message('note_on', note=note, velocity=vel))
 
     def send_note_off(self, note):
-        if self.output_port:
+        if self._raw_send is not None:
+            self._raw_send([NOTE_OFF, note, 0])
+        elif self.output_port:
             self.output_port.send(mido.Message('note_off', note=note, velocity=0))
 
     def update_notes(self, detected_freqs):
         if not self.output_port: return
 
         # 1. Convert new freqs to MIDI note numbers
-        incoming_midi_notes = set()
-        for f in detected_freqs:
-            if f > 60: # Ignore rumble below ~60Hz
-                # Formula: 69 + 12 * log2(freq / 440)
-                midi_num = int(round(69 + 12 * math.log2(f / 440)))
-                incoming_midi_notes.add(midi_num)
+        incoming = 0
+        if len(detected_freqs):
+            freqs = np.asarray(detected_freqs, dtype=np.float64)
+            freqs = freqs[freqs > MIN_NOTE_FREQ]
+            # Formula: 69 + 12 * log2(freq / 440), for all freqs at once
+            notes = np.round(69 + 12 * np.log2(freqs / 440)).astype(np.int64)
+            for note in notes[notes <= 127].tolist():
+                incoming |= 1 << note
 
-        # 2. Logic: New Notes (Turn ON)
-        for note in incoming_midi_notes:
-            if note not in self.active_midi_notes:
-                self.send_note_on(note)
-                self.active_midi_notes.add(note)
+        self._apply_notes(incoming)
 
-            # Reset missing counter if note is present
-            if note in self.missing_counter:
-                del self.missing_counter[note]
+    def update_notes_from_bins(self, detected_bins):
+        """
+        Same as update_notes, for detections reported as FFT bins
+        (see make_frame_detector): a table lookup instead of log2.
+        """
+        if not self.output_port: return
 
-        # 3. Logic: Missing Notes (Debounce OFF)
-        # Check notes that are currently active but NOT in incoming
-        candidates_for_off = self.active_midi_notes - incoming_midi_notes
+        incoming = 0
+        bin_to_bit = self._bin_to_bit
+        for b in detected_bins.tolist():
+            incoming |= bin_to_bit[b]
+
+        self._apply_notes(incoming)
+
+    def _apply_notes(self, incoming):
+        """
+        Runs the note state machine for one frame.
+        incoming: bitmask of the MIDI notes detected this frame.
+        """
+        active = self._active_mask
+        missing_counter = self._missing
+
+        # 2. Logic: New Notes (Turn ON)
+        for note in _notes_in(incoming & ~active):
+            self.send_note_on(note)
 
-        for note in candidates_for_off:
-            # Increment missing counter
-            self.missing_counter[note] = self.missing_counter.get(note, 0) + 1
+        # Notes that came back before being killed start counting afresh
+        if missing_counter:
+            for note in [n for n in missing_counter if incoming >> n & 1]:
+                del missing_counter[note]
 
+        # 3. Logic: Missing Notes (Debounce OFF)
+        # Notes that are currently active but NOT in incoming
+        killed = 0
+        for note in _notes_in(active & ~incoming):
+            count = missing_counter.get(note, 0) + 1
             # If missing for enough frames, kill it
-            if self.missing_counter[note] >= self.FRAMES_TO_KILL:
+            if count >= self.FRAMES_TO_KILL:
                 self.send_note_off(note)
-                self.active_midi_notes.remove(note)
-                del self.missing_counter[note]
+                missing_counter.pop(note, None)
+                killed |= 1 << note
+            else:
+                missing_counter[note] = count
+
+        self._active_mask = (active | incoming) & ~killed
+
+def _notes_in(mask):
+    """
+    Yields the MIDI note numbers set in a note bitmask, lowest first.
+    """
+    while mask:
+        low_bit = mask & -mask
+        yield low_bit.bit_length() - 1
+        mask ^= low_bit
@@ -1,4 +1,96 @@
-# Project: PyPolyGuitar
-# File: test_fft.py
-# Description: Placeholder for test_fft logic.
-
+import os
+import tempfile
+import threading
+import unittest
+from unittest.mock import MagicMock, patch
+import numpy as np
+from src.dsp import fft as fft_module
+from src.dsp.fft import RealFFT, PipelinedRealFFT, load_wisdom, save_wisdom
+
+class TestRealFFT(unittest.TestCase):
+    def test_matches_numpy_rfft(self):
+        size = 2048
+        fft = RealFFT(size)
+        self.assertEqual(len(fft.input), size)
+        self.assertEqual(len(fft.output), size // 2 + 1)
+
+        rng = np.random.default_rng(0)
+        signal = rng.standard_normal(size).astype(np.float32)
+        fft.input[:] = signal
+        result = fft.execute()
+
+        np.testing.assert_allclose(result, np.fft.rfft(signal), rtol=1e-3, atol=1e-3)
+
+    def test_input_preserved(self):
+        fft = RealFFT(256)
+        fft.input[:64] = 1.0
+        fft.execute()
+        # Zero-padded tail must survive the transform
+        self.assertTrue(np.all(fft.input[64:] == 0.0))
+        self.assertTrue(np.all(fft.input[:64] == 1.0))
+
+    def test_pipelined_returns_previous_frame(self):
+        size = 256
+        fft = PipelinedRealFFT(size)
+        rng = np.random.default_rng(1)
+        frames = [rng.standard_normal(64).astype(np.float32) for _ in range(4)]
+
+        try:
+            fft.input[:64] = frames[0]
+            self.assertIsNone(fft.execute())
+            for previous, frame in zip(frames, frames[1:]):
+                fft.input[:64] = frame
+                result = fft.execute()
+                np.testing.assert_allclose(result, np.fft.rfft(previous, n=size), rtol=1e-3, atol=1e-3)
+
+            # After a reset the pipeline restarts empty
+            fft.reset()
+            self.assertIsNone(fft.execute())
+        finally:
+            fft.close()
+
+    def test_pipelined_starts_worker_on_creation(self):
+        # The worker must exist before the caller pins/promotes itself
+        before = threading.active_count()
+        fft = PipelinedRealFFT(64)
+        try:
+            self.assertEqual(threading.active_count(), before + 1)
+        finally:
+            fft.close()
+
+    def test_wisdom_round_trip(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "wisdom.json")
+            # Nothing saved yet
+            self.assertFalse(load_wisdom(path))
+
+            RealFFT(256)
+            save_wisdom(path)
+            # Loads back whenever pyFFTW is available to have saved it
+            self.assertEqual(load_wisdom(path), os.path.exists(path))
+
+    def test_bad_wisdom_is_ignored(self):
+        fake_pyfftw = MagicMock()
+        fake_pyfftw.export_wisdom.return_value = (b'(fftw-3.3.10 fftw_wisdom)', b'', b'\xff')
+        with tempfile.TemporaryDirectory() as tmp, \
+                patch.object(fft_module, '_HAS_PYFFTW', True), \
+                patch.object(fft_module, 'pyfftw', fake_pyfftw, create=True):
+            path = os.path.join(tmp, "wisdom.json")
+
+            # Saved as plain JSON text and imported back byte for byte
+            save_wisdom(path)
+            fake_pyfftw.import_wisdom.return_value = (True, True, True)
+            self.assertTrue(load_wisdom(path))
+            self.assertEqual(fake_pyfftw.import_wisdom.call_args.args[0], fake_pyfftw.export_wisdom.return_value)
+
+            # Stale wisdom that FFTW rejects
+            fake_pyfftw.import_wisdom.side_effect = TypeError("bad wisdom")
+            self.assertFalse(load_wisdom(path))
+
+            # Corrupt file
+            with open(path, 'wb') as f:
+                f.write(b'\x80\x04not json')
+            self.assertFalse(load_wisdom(path))
+
+if __name__ == '__main__':
+    unittest.main()
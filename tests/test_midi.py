@@ -1,5 +1,6 @@
 import unittest
-from unittest.mock import MagicMock
+import numpy as np
+from unittest.mock import MagicMock, patch
 from src.midi.interface import MidiInterface
 
 class TestMidiInterface(unittest.TestCase):
@@ -46,5 +47,60 @@ class TestMidiInterface(unittest.TestCase):
         # We expect at least 3 calls
         self.assertGreaterEqual(len(calls), 3)
 
+    def test_update_notes_from_bins(self):
+        midi = MidiInterface(port_name="TestPort", sample_rate=48000, padded_size=2000)
+        midi.output_port = MagicMock()
+
+        # 24 Hz bins: 18 -> 432 Hz (A4), 2 -> 48 Hz (rumble, ignored)
+        midi.update_notes_from_bins(np.array([18, 2], dtype=np.int32))
+        self.assertEqual(midi.active_midi_notes, {69})
+
+        # Lookup agrees with the frequency path
+        other = MidiInterface(port_name="TestPort", sample_rate=48000, padded_size=2000)
+        other.output_port = MagicMock()
+        other.update_notes([18 * 24.0, 2 * 24.0])
+        self.assertEqual(other.active_midi_notes, midi.active_midi_notes)
+
+    def test_note_returning_resets_debounce(self):
+        self.midi.update_notes([440.0])
+        self.midi.update_notes([])
+        self.midi.update_notes([])
+        self.assertEqual(self.midi.missing_counter, {69: 2})
+
+        # Back before the kill frame: stays on, no second note_on, counter reset
+        self.midi.update_notes([440.0])
+        self.assertEqual(self.midi.active_midi_notes, {69})
+        self.assertEqual(self.midi.missing_counter, {})
+        self.assertEqual(self.midi.output_port.send.call_count, 1)
+
+    def test_raw_bytes_on_rtmidi_backend(self):
+        port = MagicMock()
+        midi = MidiInterface(port_name="TestPort")
+        with patch('mido.open_output', return_value=port):
+            midi.open_port()
+
+        midi.update_notes([440.0])
+        for _ in range(3):
+            midi.update_notes([])
+
+        self.assertEqual(port._rt.send_message.call_args_list[0].args, ([0x90, 69, 100],))
+        self.assertEqual(port._rt.send_message.call_args_list[1].args, ([0x80, 69, 0],))
+        port.send.assert_not_called()
+
+    def test_close_port_releases_notes(self):
+        port = self.midi.output_port
+        self.midi.update_notes([440.0, 82.4])
+        self.midi.close_port()
+
+        self.assertEqual(self.midi.active_midi_notes, set())
+        self.assertIsNone(self.midi.output_port)
+        port.close.assert_called_once()
+        # Two note_on, then two note_off
+        self.assertEqual(port.send.call_count, 4)
+
+        # Closing again is a no-op
+        self.midi.close_port()
+        port.close.assert_called_once()
+
 if __name__ == '__main__':
     unittest.main()
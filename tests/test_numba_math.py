@@ -1,9 +1,15 @@
+import os
+import subprocess
+import sys
+import tempfile
 import unittest
 import numpy as np
 from src.dsp.numba_math import (
     blackman_harris_window,
     apply_window_and_pad,
+    make_frame_detector,
     spectral_ops_and_detect,
+    _argmax_nonneg,
 )
 
 class TestNumbaMath(unittest.TestCase):
@@ -14,6 +20,51 @@ class TestNumbaMath(unittest.TestCase):
         self.assertTrue(np.all(window >= 0))
         self.assertTrue(np.all(window <= 1))
 
+        # Memoized per size, but callers get their own writable copy
+        again = blackman_harris_window(size)
+        np.testing.assert_array_equal(again, window)
+        self.assertIsNot(again, window)
+        self.assertTrue(again.flags.writeable)
+
+    def test_apply_window_and_pad(self):
+        buffer = np.ones(4, dtype=np.float32)
+        window = np.array([0.0, 0.5, 1.0, 0.5], dtype=np.float32)
+        padded = np.zeros(8, dtype=np.float32)
+
+        rms = apply_window_and_pad(buffer, len(buffer), window, padded)
+        np.testing.assert_array_equal(padded, [0.0, 0.5, 1.0, 0.5, 0, 0, 0, 0])
+        # RMS is of the raw samples, not the windowed ones
+        self.assertAlmostEqual(rms, 1.0)
+
+        # Only the head is rewritten; the zero tail is left as-is
+        apply_window_and_pad(buffer * 2, len(buffer), window, padded)
+        np.testing.assert_array_equal(padded, [0.0, 1.0, 2.0, 1.0, 0, 0, 0, 0])
+
+    def test_apply_window_and_pad_wraps_ring(self):
+        # Most recent 4 samples end at index 2: [ring[5], ring[6], ring[0], ring[1]]
+        ring = np.array([10, 11, 0, 0, 0, 20, 21], dtype=np.float32)
+        window = np.ones(4, dtype=np.float32)
+        padded = np.zeros(6, dtype=np.float32)
+
+        rms = apply_window_and_pad(ring, 2, window, padded)
+        np.testing.assert_array_equal(padded, [20, 21, 10, 11, 0, 0])
+        self.assertAlmostEqual(rms, np.sqrt(np.mean(np.square([20.0, 21.0, 10.0, 11.0]))), places=4)
+
+    def test_frame_detector_whitening(self):
+        rng = np.random.default_rng(1)
+        fft_complex = (rng.standard_normal(1025) + 1j * rng.standard_normal(1025)).astype(np.complex64)
+        work_spec = np.zeros(1025, dtype=np.float32)
+        out_bins = np.zeros(6, dtype=np.int32)
+
+        # A threshold above 1.0 detects nothing, leaving the whitened magnitude
+        expected = np.abs(fft_complex)
+        expected /= expected.max()
+        for parallel in (False, True):
+            detect_frame = make_frame_detector(2048, 2048, parallel=parallel)
+            self.assertEqual(detect_frame(fft_complex, work_spec, out_bins, 2.0), 0)
+            np.testing.assert_allclose(work_spec, expected, rtol=1e-5)
+            self.assertAlmostEqual(float(work_spec.max()), 1.0, places=6)
+
     def test_pipeline_sine_wave(self):
         sample_rate = 48000
         duration = 1.0  # seconds
@@ -32,14 +83,15 @@ class TestNumbaMath(unittest.TestCase):
         # Pad and FFT
         padded_size = 2048
 
-        ready_for_fft = apply_window_and_pad(buffer, window, padded_size)
+        ready_for_fft = np.zeros(padded_size, dtype=np.float32)
+        apply_window_and_pad(buffer, len(buffer), window, ready_for_fft)
 
         # FFT (Standard Numpy)
         fft_complex = np.fft.rfft(ready_for_fft)
         fft_magnitude = np.abs(fft_complex).astype(np.float32)
 
         # Detect
-        detected_freqs = spectral_ops_and_detect(fft_magnitude, sample_rate, padded_size)
+        detected_freqs = spectral_ops_and_detect(fft_magnitude, np.empty_like(fft_magnitude), sample_rate, padded_size)
 
         # Check if it's close to 440
         # Resolution is 48000 / 2048 = ~23.4 Hz.
@@ -80,10 +132,14 @@ class TestNumbaMath(unittest.TestCase):
         # but the function expects raw magnitude input.
 
         # Run subtraction logic
-        detected_freqs = spectral_ops_and_detect(spectrum, sample_rate, padded_size, min_threshold=0.1)
+        detected_freqs = spectral_ops_and_detect(spectrum, np.empty_like(spectrum), sample_rate, padded_size, min_threshold=0.1)
 
         print(f"Detected chord frequencies: {detected_freqs}")
 
+        # Fixed-size float32 result, not a typed List
+        self.assertIsInstance(detected_freqs, np.ndarray)
+        self.assertEqual(detected_freqs.dtype, np.float32)
+
         # We expect to find E2 and A2 approx
         # Convert detected freqs back to bins to verify or check range
 
@@ -101,5 +157,126 @@ class TestNumbaMath(unittest.TestCase):
         harmonic_detected = any(abs(f - e2_harmonic_freq) < freq_res for f in detected_freqs)
         self.assertFalse(harmonic_detected, f"Harmonic ({e2_harmonic_freq}Hz) incorrectly detected as note")
 
+    def test_frame_detector_output_array(self):
+        fft_complex = np.zeros(1025, dtype=np.complex64)
+        fft_complex[[100, 167, 251]] = [1.0, 0.6j, -0.3]
+        original = fft_complex.copy()
+        out_bins = np.zeros(2, dtype=np.int32)
+        work_spec = np.empty(1025, dtype=np.float32)
+        detect_frame = make_frame_detector(2048, 2048)
+
+        # Stops at len(out_bins) even though a third peak is above threshold
+        self.assertEqual(detect_frame(fft_complex, work_spec, out_bins, 0.05), 2)
+        np.testing.assert_array_equal(out_bins, [100, 167])
+
+        # Input spectrum is not modified; the scratch is
+        np.testing.assert_array_equal(fft_complex, original)
+        self.assertEqual(work_spec[100], 0.0)
+
+        # Compiled for one spectrum size only
+        with self.assertRaises(ValueError):
+            detect_frame(fft_complex[:-1].copy(), work_spec, out_bins, 0.05)
+
+    def test_frame_detector_matches_generic(self):
+        rng = np.random.default_rng(6)
+        for sample_rate, padded_size in ((48000, 2000), (48000, 8192)):
+            n = padded_size // 2 + 1
+            scale = rng.random(n) ** 6
+            fft_complex = (scale * (rng.standard_normal(n) + 1j * rng.standard_normal(n))).astype(np.complex64)
+            work_spec = np.empty(n, dtype=np.float32)
+            expected = spectral_ops_and_detect(np.abs(fft_complex), work_spec, sample_rate, padded_size)
+
+            for parallel in (False, True):
+                detect_frame = make_frame_detector(sample_rate, padded_size, parallel=parallel)
+                out_bins = np.zeros(6, dtype=np.int32)
+                n_found = detect_frame(fft_complex, work_spec, out_bins, 0.05)
+                # The session kernel reports bins rather than Hz
+                np.testing.assert_allclose(out_bins[:n_found] * (sample_rate / padded_size), expected, rtol=1e-6)
+
+    def test_make_frame_detector_loads_from_cache(self):
+        # A fresh process must load the kernel compiled by an earlier one
+        code = (
+            "from src.dsp.numba_math import make_frame_detector\n"
+            "detect_frame = make_frame_detector(48000, 2000)\n"
+            "print(sum(detect_frame.stats.cache_hits.values()))\n"
+        )
+        repo_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        # A private cache dir: the first run is always cold and nothing is
+        # written into the source tree
+        with tempfile.TemporaryDirectory() as cache_dir:
+            env = dict(os.environ, NUMBA_CACHE_DIR=cache_dir)
+            hits = [
+                int(subprocess.run([sys.executable, "-c", code], cwd=repo_root, env=env,
+                                   capture_output=True, text=True, check=True).stdout.split()[-1])
+                for _ in range(2)
+            ]
+        self.assertEqual(hits[0], 0)
+        self.assertGreater(hits[1], 0)
+
+    def test_spectral_ops_and_detect_leaves_input(self):
+        spectrum = np.zeros(1025, dtype=np.float32)
+        spectrum[100] = 2.0
+        original = spectrum.copy()
+        work_spec = np.empty_like(spectrum)
+
+        detected_freqs = spectral_ops_and_detect(spectrum, work_spec, 2048, 2048)
+
+        np.testing.assert_array_equal(detected_freqs, [100.0])
+        # Whitening and subtraction happen in the scratch, not the input
+        np.testing.assert_array_equal(spectrum, original)
+
+    def test_mad_threshold_rejects_noise_floor(self):
+        rng = np.random.default_rng(5)
+        # Loud, broadband noise floor plus one clear note
+        spectrum = (0.3 + 0.1 * rng.random(1025)).astype(np.float32)
+        spectrum[100] = 2.0
+
+        fixed = spectral_ops_and_detect(spectrum, np.empty_like(spectrum), 2048, 2048)
+        adaptive = spectral_ops_and_detect(spectrum, np.empty_like(spectrum), 2048, 2048, mad_factor=5.0)
+
+        # The fixed threshold takes noise bins as notes; the adaptive one only the note
+        self.assertEqual(len(fixed), 6)
+        np.testing.assert_array_equal(adaptive, [100.0])
+
+        # Same behaviour through the session kernel
+        detect_frame = make_frame_detector(2048, 2048, mad_factor=5.0)
+        work_spec = np.empty_like(spectrum)
+        out_bins = np.zeros(6, dtype=np.int32)
+        self.assertEqual(detect_frame(spectrum.astype(np.complex64), work_spec, out_bins, 0.05), 1)
+        self.assertEqual(out_bins[0], 100)
+
+    def test_spectrum_below_search_range(self):
+        # Every bin is below LOWEST_SEARCH_FREQ: nothing to search
+        spectrum = np.ones(3, dtype=np.float32)
+        detected_freqs = spectral_ops_and_detect(spectrum, np.empty_like(spectrum), 48000, 2048)
+        self.assertEqual(len(detected_freqs), 0)
+
+    def test_argmax_nonneg(self):
+        values = np.array([9.0, 0.0, 0.5, 3.0, 1.0, 3.0, 0.0], dtype=np.float32)
+        # Ignores values before start; ties resolve to the lowest index
+        self.assertEqual(_argmax_nonneg(values, 1), 3)
+        self.assertEqual(_argmax_nonneg(values, 4), 5)
+        self.assertEqual(_argmax_nonneg(np.zeros(4, dtype=np.float32), 0), 0)
+
+    def test_subtraction_finds_peak_after_block_rescan(self):
+        sample_rate = 48000
+        padded_size = 2048
+        freq_res = sample_rate / padded_size
+        spectrum = np.zeros(padded_size // 2 + 1, dtype=np.float32)
+
+        # One note whose kill zones wipe out the maxima of several blocks,
+        # plus a quieter note that was no block's maximum at the start.
+        spectrum[8:13] = 0.9
+        spectrum[10] = 1.0
+        for h in range(2, 6):
+            spectrum[10 * h - 3:10 * h + 4] = 0.9
+        spectrum[200] = 0.5
+
+        detected_freqs = spectral_ops_and_detect(spectrum, np.empty_like(spectrum), sample_rate, padded_size, min_threshold=0.1)
+
+        self.assertEqual(len(detected_freqs), 2)
+        self.assertAlmostEqual(detected_freqs[0], 10 * freq_res)
+        self.assertAlmostEqual(detected_freqs[1], 200 * freq_res)
+
 if __name__ == '__main__':
     unittest.main()
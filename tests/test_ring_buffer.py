@@ -51,5 +51,50 @@ class TestRingBuffer(unittest.TestCase):
         read_back = rb.read_recent(5)
         np.testing.assert_array_equal(read_back, np.array([5, 6, 7, 8, 9], dtype=np.float32))
 
+    def test_write_count_is_monotonic(self):
+        rb = RingBuffer(4)
+        rb.write(np.arange(3, dtype=np.float32))
+        self.assertEqual(rb.write_count, 3)
+        self.assertFalse(rb.is_full)
+
+        rb.write(np.arange(3, dtype=np.float32))
+        # Position wraps, the published count does not
+        self.assertEqual(rb.write_count, 6)
+        self.assertEqual(rb.write_index, 2)
+        self.assertTrue(rb.is_full)
+
+    def test_read_recent_into(self):
+        rb = RingBuffer(5)
+        rb.write(np.arange(7, dtype=np.float32)) # wraps: holds 2..6
+        out = np.zeros(4, dtype=np.float32)
+
+        result = rb.read_recent_into(out)
+        self.assertIs(result, out)
+        np.testing.assert_array_equal(out, np.array([3, 4, 5, 6], dtype=np.float32))
+
+    def test_read_recent_reuses_scratch(self):
+        rb = RingBuffer(8)
+        rb.write(np.arange(4, dtype=np.float32))
+        first = rb.read_recent(2)
+        second = rb.read_recent(2)
+        self.assertIs(first, second)
+
+    def test_snapshot_is_zero_copy(self):
+        rb = RingBuffer(4)
+        rb.write(np.arange(3, dtype=np.float32))
+        rb.write(np.arange(3, dtype=np.float32))
+        buffer, write_index = rb.snapshot()
+        self.assertIs(buffer, rb.buffer)
+        self.assertEqual(write_index, 2)
+
+    def test_wait_for_data(self):
+        rb = RingBuffer(8)
+        self.assertFalse(rb.wait_for_data(timeout=0.0))
+
+        rb.write(np.ones(2, dtype=np.float32))
+        self.assertTrue(rb.wait_for_data(timeout=0.0))
+        # Consumed: nothing new since
+        self.assertFalse(rb.wait_for_data(timeout=0.0))
+
 if __name__ == '__main__':
     unittest.main()